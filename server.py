@@ -1,14 +1,16 @@
-import subprocess
-import json
 import threading
 import os
+import re
 import sys
 import shlex
 import asyncio
+import hmac
+import logging
+import orjson
+from collections import deque
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, Security, Request
-from fastapi.responses import StreamingResponse
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, ORJSONResponse
 
 from pydantic import BaseModel
 import uvicorn
@@ -21,241 +23,540 @@ import uvicorn
 MCP_CONFIG_FILE = os.environ.get("MCP_CONFIG_FILE")
 MCP_SERVER_NAME = os.environ.get("MCP_SERVER_NAME")
 MCP_AUTH_TOKEN = os.environ.get("MCP_AUTH_TOKEN")
+# Pre-encoded once so the auth middleware compares raw header bytes directly
+MCP_AUTH_TOKEN_BYTES = MCP_AUTH_TOKEN.encode() if MCP_AUTH_TOKEN else None
 
-security = HTTPBearer()
-
-async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
-    if MCP_AUTH_TOKEN and credentials.credentials != MCP_AUTH_TOKEN:
-        raise HTTPException(status_code=403, detail="Invalid authentication token")
-    return credentials
+logger = logging.getLogger("mcp-proxy")
 
+# Module-level aliases skip the orjson attribute lookup on every hot-path call
+_dumps = orjson.dumps
+_loads = orjson.loads
 
 MCP_COMMAND = []
 MCP_CWD = os.environ.get("MCP_CWD", os.getcwd())
 MCP_ENV = os.environ.copy()
 
-if MCP_CONFIG_FILE and MCP_SERVER_NAME:
-    print(f"Loading configuration for '{MCP_SERVER_NAME}' from {MCP_CONFIG_FILE}")
-    try:
-        with open(MCP_CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-        
-        server_config = config.get("mcpServers", {}).get(MCP_SERVER_NAME)
-        if not server_config:
-            print(f"Error: Server '{MCP_SERVER_NAME}' not found in 'mcpServers' configuration.")
+def load_mcp_config():
+    """Resolves MCP_COMMAND/MCP_CWD/MCP_ENV from the config file or env vars.
+
+    Called from the lifespan handler so importing the module (e.g. for
+    multi-worker uvicorn) stays free of config I/O.
+    """
+    global MCP_COMMAND
+
+    if MCP_CONFIG_FILE and MCP_SERVER_NAME:
+        logger.info("Loading configuration for '%s' from %s", MCP_SERVER_NAME, MCP_CONFIG_FILE)
+        try:
+            with open(MCP_CONFIG_FILE, 'rb') as f:
+                config = orjson.loads(f.read())
+
+            server_config = config.get("mcpServers", {}).get(MCP_SERVER_NAME)
+            if not server_config:
+                logger.error("Server '%s' not found in 'mcpServers' configuration.", MCP_SERVER_NAME)
+                sys.exit(1)
+
+            command = server_config.get("command")
+            args = server_config.get("args", [])
+            env_vars = server_config.get("env", {})
+
+            if not command:
+                logger.error("No 'command' specified for server '%s'.", MCP_SERVER_NAME)
+                sys.exit(1)
+
+            MCP_COMMAND = [command] + args
+            MCP_ENV.update(env_vars)
+
+        except FileNotFoundError:
+            logger.error("Config file not found at %s", MCP_CONFIG_FILE)
             sys.exit(1)
-            
-        command = server_config.get("command")
-        args = server_config.get("args", [])
-        env_vars = server_config.get("env", {})
-        
-        if not command:
-            print(f"Error: No 'command' specified for server '{MCP_SERVER_NAME}'.")
+        except orjson.JSONDecodeError:
+            logger.error("Failed to parse JSON config file at %s", MCP_CONFIG_FILE)
+            sys.exit(1)
+        except Exception as e:
+            logger.error("Error loading config: %s", e)
             sys.exit(1)
-            
-        MCP_COMMAND = [command] + args
-        MCP_ENV.update(env_vars)
-        
-    except FileNotFoundError:
-        print(f"Error: Config file not found at {MCP_CONFIG_FILE}")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Failed to parse JSON config file at {MCP_CONFIG_FILE}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        sys.exit(1)
 
-elif os.environ.get("MCP_COMMAND"):
-    # Fallback to direct environment variable configuration
-    MCP_COMMAND_STR = os.environ.get("MCP_COMMAND")
-    MCP_COMMAND = shlex.split(MCP_COMMAND_STR)
-    # CWD and other env vars are already set/inherited
+    elif os.environ.get("MCP_COMMAND"):
+        # Fallback to direct environment variable configuration
+        MCP_COMMAND = shlex.split(os.environ.get("MCP_COMMAND"))
+        # CWD and other env vars are already set/inherited
 
-else:
-    print("Error: Configuration missing.")
-    print("Set MCP_CONFIG_FILE and MCP_SERVER_NAME, or MCP_COMMAND.")
-    sys.exit(1)
+    else:
+        logger.error("Configuration missing. Set MCP_CONFIG_FILE and MCP_SERVER_NAME, or MCP_COMMAND.")
+        sys.exit(1)
+
+    logger.info("Starting MCP Proxy for command: %s", MCP_COMMAND)
+    logger.info("Working Directory: %s", MCP_CWD)
 
 MCP_PORT = int(os.environ.get("MCP_PORT", 8000))
 MCP_HOST = os.environ.get("MCP_HOST", "0.0.0.0")
 
-print(f"Starting MCP Proxy for command: {MCP_COMMAND}")
-print(f"Working Directory: {MCP_CWD}")
+# Upper bound on in-flight requests awaiting a response from the MCP child.
+# Beyond this we shed load with 503 instead of accumulating futures.
+MAX_PENDING_REQUESTS = 10000
+
+def _rpc_key(raw_id):
+    """Canonical response_futures key for a JSON-RPC id.
+
+    Ids may arrive as int or str; clients and servers do not always agree on
+    the type, so both the register and dispatch paths key on str(id).
+    """
+    return None if raw_id is None else str(raw_id)
+
+
+_SLOT_MASK = 0xFFFF  # 65536 slots in the integer-id fast path
+
+_IOV_MAX = 1024  # max buffers per os.writev call (POSIX minimum guarantee)
+
+
+def _slot_index(raw_id):
+    """Slot-ring index for a numeric JSON-RPC id, or None for the dict path.
+
+    Accepts ints and int-like strings so a child that echoes 1 back as "1"
+    still lands in the same slot.
+    """
+    if isinstance(raw_id, bool):
+        return None
+    if isinstance(raw_id, int):
+        return raw_id & _SLOT_MASK
+    try:
+        return int(raw_id) & _SLOT_MASK
+    except (TypeError, ValueError):
+        return None
+
 
 class MCPProcess:
     def __init__(self):
         self.process = None
-        self.lock = asyncio.Lock()
         self.response_futures: dict[str, asyncio.Future] = {}
-        self.sse_queues: list[asyncio.Queue] = []
+        # Fast path for numeric ids: slots hold (key, future) tuples indexed
+        # by id & _SLOT_MASK, turning the per-response dict hash + pop into a
+        # list load. Colliding or non-numeric ids use response_futures.
+        self._slots: list = [None] * (_SLOT_MASK + 1)
+        # In-flight futures across both the slot ring and the dict, tested
+        # against MAX_PENDING_REQUESTS
+        self._pending = 0
+        self.sse_queues: set[asyncio.Queue] = set()
         self.reader_task = None
+        self.stderr_task = None
+        self.write_queue: asyncio.Queue = asyncio.Queue()
+        self.writer_task = None
+        self._stdin_fd = None
+        # Set while the child is accepting requests; cleared the moment the
+        # read loop sees it die, so racing senders fail fast instead of
+        # registering futures no one will ever resolve.
+        self._alive = asyncio.Event()
+        self._stderr_tail: deque = deque(maxlen=40)
 
     async def start(self):
         try:
-            self.process = subprocess.Popen(
-                MCP_COMMAND,
+            self.process = await asyncio.create_subprocess_exec(
+                *MCP_COMMAND,
                 cwd=MCP_CWD,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=sys.stderr, # Direct to sys.stderr so it doesn't block and logs are visible
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
                 env=MCP_ENV,
-                text=True,
-                bufsize=1  # Line buffered
+                limit=1 << 20  # Raise the 64KiB StreamReader default so large lines don't stall
             )
             print("MCP Server started.")
-            
-            # Start background reader
+
+            # Raw stdin fd for the writev fast path; the transport has
+            # already made it non-blocking. Not every event loop exposes
+            # the pipe object, so None falls back to the StreamWriter.
+            try:
+                pipe = self.process.stdin.transport.get_extra_info("pipe")
+                self._stdin_fd = pipe.fileno() if pipe is not None else None
+            except (AttributeError, OSError):
+                self._stdin_fd = None
+
+            # Start background readers and the stdin writer
             self.reader_task = asyncio.create_task(self._read_loop())
-            
+            self.stderr_task = asyncio.create_task(self._stderr_loop())
+            self.writer_task = asyncio.create_task(self._writer_loop())
+
+            self._alive.set()
+
         except Exception as e:
             print(f"Failed to start MCP server: {e}")
             raise
 
     async def stop(self):
+        self._alive.clear()
+        if self.writer_task:
+            # Sentinel lets the writer flush anything still queued
+            await self.write_queue.put(None)
+            await self.writer_task
         if self.process:
-            self.process.terminate()
-            # self.process.wait() # avoid blocking
+            if self.process.returncode is None:
+                try:
+                    self.process.terminate()
+                except ProcessLookupError:
+                    pass  # already died
+            await self.process.wait()
             print("MCP Server stopped.")
-        if self.reader_task:
-            self.reader_task.cancel()
+        for task in (self.reader_task, self.stderr_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def _writer_loop(self):
+        """Drains write_queue to the child's stdin, one drain() per batch.
+
+        Batching turns N concurrent sends into a single writelines + drain,
+        letting the kernel coalesce small pipe writes. A None item shuts the
+        loop down after the preceding batch is flushed.
+        """
+        while True:
+            batch = [await self.write_queue.get()]
+            while True:
+                try:
+                    batch.append(self.write_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            lines = [item for item in batch if item is not None]
+            if lines:
+                try:
+                    leftover = self._writev(lines)
+                    if leftover is not None:
+                        self.process.stdin.write(leftover)
+                        await self.process.stdin.drain()
+                except Exception as e:
+                    print(f"Error writing to MCP: {e}")
+
+            if len(lines) != len(batch):  # sentinel seen
+                break
+
+    def _writev(self, lines):
+        """Writes the batch straight to the stdin fd with os.writev.
+
+        Bypasses the StreamWriter's intermediate buffer: the whole batch goes
+        out in one vectored syscall per _IOV_MAX slice. Returns None when
+        everything was written, or the unwritten tail (when the fd is
+        unavailable, the pipe is full, or the write was partial) for the
+        caller to flush through the StreamWriter.
+
+        The fd path is only taken while the transport's write buffer is
+        empty: drain() merely waits for the low-water mark, so after a
+        leftover the buffer may still hold bytes, and a writev issued then
+        would jump ahead of them and corrupt the line framing. Until the
+        transport has verifiably flushed, everything routes through the
+        StreamWriter, which preserves order itself.
+        """
+        if self._stdin_fd is None:
+            return b"".join(lines)
+        try:
+            buffered = self.process.stdin.transport.get_write_buffer_size()
+        except AttributeError:
+            buffered = 1
+        if buffered:
+            return b"".join(lines)
+
+        pos = 0
+        while pos < len(lines):
             try:
-                await self.reader_task
-            except asyncio.CancelledError:
-                pass
+                written = os.writev(self._stdin_fd, lines[pos:pos + _IOV_MAX])
+            except (BlockingIOError, InterruptedError):
+                return b"".join(lines[pos:])
+            while pos < len(lines) and written >= len(lines[pos]):
+                written -= len(lines[pos])
+                pos += 1
+            if written:
+                return b"".join([lines[pos][written:]] + lines[pos + 1:])
+        return None
+
+    async def _stderr_loop(self):
+        """Forwards the MCP process stderr to our own so logs stay visible."""
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            decoded = line.decode("utf-8", "replace")
+            self._stderr_tail.append(decoded)
+            sys.stderr.write(decoded)
 
     async def _read_loop(self):
-        """Reads stdout from the MCP process and dispatches messages."""
-        loop = asyncio.get_event_loop()
-        while self.process and self.process.poll() is None:
+        """Reads stdout from the MCP process and dispatches messages.
+
+        Reads in 64KiB chunks and splits lines in user space, so one wakeup
+        can deliver many messages instead of paying a readline per line.
+        """
+        buf = bytearray()
+        while self.process and self.process.returncode is None:
             try:
-                # Run blocking readline in executor to avoid blocking the event loop
-                line = await loop.run_in_executor(None, self.process.stdout.readline)
-                if not line:
+                chunk = await self.process.stdout.read(65536)
+                if not chunk:
                     break
-                
-                await self._dispatch_response(line)
-                
+
+                buf += chunk
+                while (nl := buf.find(b"\n")) != -1:
+                    line = bytes(buf[:nl])
+                    del buf[:nl + 1]
+
+                    # Build the SSE frame exactly once per message; consumers
+                    # yield it verbatim.
+                    sse_frame = b"data: " + line.rstrip(b"\r") + b"\n\n"
+                    await self._dispatch_response(line, sse_frame)
+
             except Exception as e:
                 print(f"Error reading from MCP: {e}")
                 break
         
+        # Gate new senders before failing the in-flight ones, so nothing can
+        # register a future between cleanup and the 503s kicking in.
+        self._alive.clear()
         print("MCP Process exited or stream ended.")
-        # Cleanup
-        for future in self.response_futures.values():
+
+        detail = "MCP process exited"
+        stderr_tail = "".join(self._stderr_tail).strip()
+        if stderr_tail:
+            detail = f"MCP process exited. Last stderr output:\n{stderr_tail}"
+
+        slot_futures = (entry[1] for entry in self._slots if entry is not None)
+        for future in (*self.response_futures.values(), *slot_futures):
             if not future.done():
-                future.set_exception(Exception("MCP process exited"))
+                future.set_exception(Exception(detail))
 
-    async def _dispatch_response(self, line: str):
+    async def _dispatch_response(self, line: bytes, sse_frame: bytes):
         """Parses the response line and routes it to futures and SSE queues."""
         try:
-            # 1. Send to all SSE clients
-            for queue in self.sse_queues:
-                await queue.put(f"data: {line.strip()}\n\n")
+            # 1. Send to all SSE clients. put_nowait keeps the reader loop
+            # independent of client consumption; a full queue means the
+            # client is stuck, so it gets disconnected rather than stalling
+            # everyone else. The frame stays bytes all the way to the socket.
+            # Tuple snapshot: consumers may disconnect (mutating the set)
+            # between iterations.
+            for queue in tuple(self.sse_queues):
+                try:
+                    queue.put_nowait(sse_frame)
+                except asyncio.QueueFull:
+                    self.sse_queues.discard(queue)
+                    print("Dropping stalled SSE client")
+                    # Make room for the None sentinel so the generator ends cleanly
+                    try:
+                        queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        pass
+                    queue.put_nowait(None)
 
             # 2. Check for matching request ID via Future
-            response_json = json.loads(line)
+            response_json = _loads(line)
             if "id" in response_json:
-                # Normalize ID to string to avoid int/str type mismatches
-                req_id = str(response_json["id"])
-                
-                if req_id in self.response_futures:
-                    future = self.response_futures.pop(req_id)
+                raw_id = response_json["id"]
+                req_id = _rpc_key(raw_id)
+
+                future = None
+                slot = _slot_index(raw_id)
+                if slot is not None:
+                    entry = self._slots[slot]
+                    if entry is not None and entry[0] == req_id:
+                        self._slots[slot] = None
+                        future = entry[1]
+                if future is None:
+                    future = self.response_futures.pop(req_id, None)
+
+                if future is not None:
                     if not future.done():
                         future.set_result(response_json)
                 else:
                     print(f"No matching future for response ID: {req_id} (pending: {list(self.response_futures.keys())})")
                         
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             print(f"Failed to decode JSON from server: {line}")
         except Exception as e:
             print(f"Error dispatching response: {e}")
 
     async def send_request(self, request_data: dict) -> dict:
-        if not self.process or self.process.poll() is not None:
-            raise HTTPException(status_code=500, detail="MCP backend not running")
+        return await self.send_raw(_dumps(request_data), request_data.get("id"))
+
+    async def send_raw(self, body: bytes, raw_id) -> dict:
+        """Forwards a pre-serialized single-line JSON-RPC request."""
+        if not self._alive.is_set():
+            raise HTTPException(status_code=503, detail="MCP backend not running")
 
-        request_id = request_data.get("id")
+        request_id = _rpc_key(raw_id)
         should_wait = request_id is not None
+        slot = None
 
         if should_wait:
-            # Normalize ID to string to avoid int/str type mismatches
-            request_id = str(request_id)
+            if self._pending >= MAX_PENDING_REQUESTS:
+                raise HTTPException(status_code=503, detail="Too many pending MCP requests")
             loop = asyncio.get_running_loop()
             future = loop.create_future()
-            self.response_futures[request_id] = future
-
-        async with self.lock:
-            try:
-                json_str = json.dumps(request_data) + "\n"
-                self.process.stdin.write(json_str)
-                self.process.stdin.flush()
-            except Exception as e:
-                if should_wait and request_id in self.response_futures:
-                     del self.response_futures[request_id]
-                raise HTTPException(status_code=500, detail=str(e))
+            slot = _slot_index(raw_id)
+            if slot is not None and self._slots[slot] is None:
+                self._slots[slot] = (request_id, future)
+            else:
+                slot = None
+                self.response_futures[request_id] = future
+            self._pending += 1
+
+        # Each queue item is one complete JSON-RPC line, so messages can never
+        # interleave; write errors surface through the read loop failing the
+        # pending futures.
+        await self.write_queue.put(body + b"\n")
 
         if should_wait:
+            timed_out = False
+
+            def _expire():
+                nonlocal timed_out
+                if not future.done():
+                    timed_out = True
+                    future.cancel()
+
+            # Plain call_later deadline: unlike asyncio.wait_for there is no
+            # extra wrapper task per request. (120s to handle slow data-heavy
+            # tool calls.)
+            handle = loop.call_later(120.0, _expire)
             try:
-                # Wait for response (120s to handle slow data-heavy tool calls)
-                return await asyncio.wait_for(future, timeout=120.0)
-            except asyncio.TimeoutError:
-                if request_id in self.response_futures:
-                    del self.response_futures[request_id]
-                raise HTTPException(status_code=504, detail="MCP request timed out")
+                return await future
+            except asyncio.CancelledError:
+                if timed_out:
+                    raise HTTPException(status_code=504, detail="MCP request timed out")
+                # Client disconnected; let the handler cancellation propagate
+                raise
             except Exception as e:
                 # MCP Process exit exception
-                if request_id in self.response_futures:
-                    del self.response_futures[request_id]
                 raise HTTPException(status_code=500, detail=str(e))
-        
+            finally:
+                handle.cancel()
+                # Covers timeout, process exit and client disconnect
+                # (handler cancellation) alike, so entries never leak.
+                self._pending -= 1
+                if slot is not None:
+                    entry = self._slots[slot]
+                    if entry is not None and entry[1] is future:
+                        self._slots[slot] = None
+                else:
+                    self.response_futures.pop(request_id, None)
+
         return {"status": "notification_sent"}
 
     async def send_message(self, request_data: dict):
+        return await self.send_raw_message(_dumps(request_data))
+
+    async def send_raw_message(self, body: bytes):
         """Sends a message without waiting for a direct response (used for /messages)."""
-        if not self.process or self.process.poll() is not None:
-            raise HTTPException(status_code=500, detail="MCP backend not running")
-            
-        async with self.lock:
-            try:
-                json_str = json.dumps(request_data) + "\n"
-                self.process.stdin.write(json_str)
-                self.process.stdin.flush()
-            except Exception as e:
-                 raise HTTPException(status_code=500, detail=str(e))
+        if not self._alive.is_set():
+            raise HTTPException(status_code=503, detail="MCP backend not running")
+
+        await self.write_queue.put(body + b"\n")
         return {"status": "sent"}
 
 mcp_backend = MCPProcess()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    load_mcp_config()
     await mcp_backend.start()
     yield
     await mcp_backend.stop()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+PROTECTED_PATHS = {"/mcp", "/sse", "/messages"}
+
+@app.middleware("http")
+async def auth_middleware(request: Request, call_next):
+    """Bearer-token check as plain middleware.
+
+    A single constant-time comparison per request instead of the FastAPI
+    dependency-injection machinery on every hot-path call.
+    """
+    if MCP_AUTH_TOKEN_BYTES is not None and request.url.path in PROTECTED_PATHS:
+        header = b""
+        for name, value in request.scope["headers"]:
+            if name == b"authorization":
+                header = value
+                break
+        if not (header.startswith(b"Bearer ") and hmac.compare_digest(header[7:], MCP_AUTH_TOKEN_BYTES)):
+            return ORJSONResponse({"detail": "Invalid authentication token"}, status_code=403)
+    return await call_next(request)
+
+def _parse_body(body: bytes) -> dict:
+    try:
+        data = _loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(data, dict):
+        # Scalars and batch arrays can't be routed over the line framing
+        raise HTTPException(status_code=400, detail="JSON-RPC message must be a single object")
+    return data
+
+_ID_RE = re.compile(rb'"id"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)')
+
+def _at_top_level(prefix: bytes) -> bool:
+    """True when the position after `prefix` is at object top level.
+
+    Tracks string literals (including escapes) so braces and brackets inside
+    strings don't skew the depth, and a match inside a string never counts.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for byte in prefix:
+        if escaped:
+            escaped = False
+        elif in_string:
+            if byte == 0x5C:  # backslash
+                escaped = True
+            elif byte == 0x22:  # quote
+                in_string = False
+        elif byte == 0x22:
+            in_string = True
+        elif byte in (0x7B, 0x5B):  # { [
+            depth += 1
+        elif byte in (0x7D, 0x5D):  # } ]
+            depth -= 1
+    return depth == 1 and not in_string
+
+def _extract_id(body: bytes):
+    """Pulls the JSON-RPC id out of a raw body without building the dict.
+
+    The regex match only counts when it sits at the top level of the object;
+    otherwise, or when nothing matches cheaply, the body is parsed in full
+    (which also rejects non-object payloads).
+    """
+    m = _ID_RE.search(body)
+    if m and body[:1] == b"{" and _at_top_level(body[:m.start()]):
+        try:
+            return _loads(m.group(1))
+        except orjson.JSONDecodeError:
+            pass
+    return _parse_body(body).get("id")
 
 @app.post("/mcp")
-async def handle_mcp_request(request: dict, token: HTTPAuthorizationCredentials = Depends(verify_token)):
+async def handle_mcp_request(request: Request):
     """
     Forwards JSON-RPC requests to the MCP server.
     Waits for a response if 'id' is present.
     """
-    response = await mcp_backend.send_request(request)
-    return response
+    body = (await request.body()).strip()
+    if not body:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if b"\n" in body or b"\r" in body:
+        # Multi-line (pretty-printed) JSON must be re-serialized to keep the
+        # one-line-per-message stdio framing intact
+        return await mcp_backend.send_request(_parse_body(body))
+    return await mcp_backend.send_raw(body, _extract_id(body))
 
 @app.get("/sse")
-async def handle_sse(request: Request, token: HTTPAuthorizationCredentials = Depends(verify_token)):
+async def handle_sse(request: Request):
     """
     Establishes an SSE stream for MCP output.
     """
-    queue = asyncio.Queue()
-    mcp_backend.sse_queues.append(queue)
+    queue = asyncio.Queue(maxsize=1024)
+    mcp_backend.sse_queues.add(queue)
     
     async def event_generator():
         try:
             # Yield initial connection message if desired, or just wait for data
-            yield "event: open\ndata: {\"status\": \"connected\"}\n\n"
+            yield b"event: open\ndata: {\"status\": \"connected\"}\n\n"
             
             while True:
                 # Check if client disconnected
@@ -263,29 +564,48 @@ async def handle_sse(request: Request, token: HTTPAuthorizationCredentials = Dep
                     break
                     
                 data = await queue.get()
+                if data is None:
+                    # Dispatcher dropped us as a stalled consumer
+                    break
                 yield data
                 queue.task_done()
         except asyncio.CancelledError:
             pass
         finally:
-            mcp_backend.sse_queues.remove(queue)
+            mcp_backend.sse_queues.discard(queue)
             
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 @app.post("/messages")
-async def handle_messages(request: dict, token: HTTPAuthorizationCredentials = Depends(verify_token)):
+async def handle_messages(request: Request):
     """
     Sends a JSON-RPC message to the MCP server efficiently (no wait for response).
     Responses will appear in the SSE stream.
     """
-    return await mcp_backend.send_message(request)
+    body = (await request.body()).strip()
+    if not body:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if b"\n" in body or b"\r" in body or body[:1] != b"{":
+        # Re-serialize multi-line bodies and reject non-object payloads
+        return await mcp_backend.send_message(_parse_body(body))
+    return await mcp_backend.send_raw_message(body)
 
 
 @app.get("/health")
 def health_check():
-    if mcp_backend.process and mcp_backend.process.poll() is None:
+    if mcp_backend.process and mcp_backend.process.returncode is None:
         return {"status": "healthy", "pid": mcp_backend.process.pid}
     return {"status": "unhealthy", "detail": "MCP process not running"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=MCP_HOST, port=MCP_PORT)
+    logging.basicConfig(level=logging.INFO)
+    # Each worker process runs its own MCPProcess via the lifespan handler,
+    # so only raise MCP_WORKERS when the MCP child is stateless.
+    uvicorn.run(
+        "server:app",
+        host=MCP_HOST,
+        port=MCP_PORT,
+        workers=int(os.environ.get("MCP_WORKERS", 1)),
+        loop="uvloop",
+        http="httptools",
+    )